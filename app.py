@@ -1,11 +1,15 @@
+import hashlib
+import os
+
 import streamlit as st
 import pandas as pd
+import numpy as np
 
 from data.data_loader import load_and_preprocess_data
 from models.popularity import get_popular_products
-from models.item_knn import get_item_knn_recommendations
-from models.svd_model import get_svd_recommendations
-from models.content_based import get_content_based_recommendations
+from models.item_knn import build_item_vectors, get_item_knn_recommendations
+from models.svd_model import fit_svd, get_svd_recommendations
+from models.content_based import build_content_index, get_content_based_recommendations
 from utils.helpers import build_id_mappings, build_user_item_matrix
 
 # ---------------------------
@@ -63,20 +67,43 @@ svd_components_requested = st.sidebar.slider(
 )
 
 # ---------------------------
-# Cache: load data
+# Cache keys
 # ---------------------------
-@st.cache_data
-def load_data(file, min_user, min_product):
-    return load_and_preprocess_data(file, min_user, min_product)
+def dataset_fingerprint(uploaded, path):
+    """
+    Small, cheap-to-hash identity for the dataset source.
+    Uploaded files: md5 of their bytes. Default file: path + mtime + size.
+    """
+    if uploaded is not None:
+        return hashlib.md5(uploaded.getvalue()).hexdigest()
+    try:
+        file_stat = os.stat(path)
+    except OSError:
+        return path
+    return (path, file_stat.st_mtime_ns, file_stat.st_size)
 
 # Default dataset path
 file_path = uploaded_file if uploaded_file is not None else "datasets/1429_1.csv"
 
+# Cached functions are keyed on these small values; large objects (dataframes,
+# matrices) are passed as underscore args so Streamlit never hashes them.
+file_key = dataset_fingerprint(uploaded_file, file_path)
+dataset_key = (file_key, min_user_reviews, min_product_reviews)
+
+# ---------------------------
+# Cache: load data
+# ---------------------------
+# cache_resource returns the same objects on every rerun instead of unpickling
+# copies; the loaded frames are treated as read-only everywhere below.
+@st.cache_resource
+def load_data(key, _file, min_user, min_product):
+    return load_and_preprocess_data(_file, min_user, min_product)
+
 # ---------------------------
 # Helper: build product lookup for nice display
 # ---------------------------
-@st.cache_data
-def build_product_lookup(_raw_df: pd.DataFrame):
+@st.cache_resource
+def build_product_lookup(key, _raw_df: pd.DataFrame):
     """
     Create lookup: product_id -> {name, brand}
     Dataset has columns: name, brand
@@ -96,14 +123,19 @@ def build_product_lookup(_raw_df: pd.DataFrame):
         # No metadata available
         return {}
 
-    meta = _raw_df.groupby("product_id", as_index=False).agg(agg_dict)
-    lookup = {}
-    for r in meta.itertuples(index=False):
-        pid = getattr(r, "product_id")
-        lookup[pid] = {
-            "name": getattr(r, "name", None),
-            "brand": getattr(r, "brand", None),
-        }
+    meta = _raw_df.groupby("product_id", as_index=False, observed=True).agg(agg_dict)
+    # Missing metadata (pd.NA / NaN) -> None, so display code can use `or` fallbacks
+    def column_or_none(col, present):
+        if not present:
+            return np.full(len(meta), None)
+        return meta[col].astype(object).where(meta[col].notna(), None).to_numpy()
+
+    names = column_or_none("name", has_name)
+    brands = column_or_none("brand", has_brand)
+    lookup = {
+        pid: {"name": n, "brand": b}
+        for pid, n, b in zip(meta["product_id"].to_numpy(), names, brands)
+    }
     return lookup
 
 def pretty_recommendations(recommended_ids, product_lookup, title="Recommendations"):
@@ -132,7 +164,7 @@ def pretty_recommendations(recommended_ids, product_lookup, title="Recommendatio
 # ---------------------------
 try:
     with st.spinner("Loading and preprocessing data..."):
-        interactions, raw_df, stats = load_data(file_path, min_user_reviews, min_product_reviews)
+        interactions, raw_df, stats = load_data(file_key, file_path, min_user_reviews, min_product_reviews)
 
     st.sidebar.success("✅ Data loaded successfully!")
     st.sidebar.metric("Rows after cleaning", f"{stats['rows_after_cleaning']:,}")
@@ -141,16 +173,28 @@ try:
     st.sidebar.metric("Total ratings", f"{stats['num_ratings']:,}")
 
     # Build mappings + matrix
-    @st.cache_data
-    def get_mappings_and_matrix(_interactions):
+    @st.cache_resource
+    def get_mappings_and_matrix(key, _interactions):
         user_to_idx, item_to_idx, idx_to_user, idx_to_item = build_id_mappings(_interactions)
         R = build_user_item_matrix(_interactions, user_to_idx, item_to_idx)
         return user_to_idx, item_to_idx, idx_to_user, idx_to_item, R
 
-    user_to_idx, item_to_idx, idx_to_user, idx_to_item, R = get_mappings_and_matrix(interactions)
+    user_to_idx, item_to_idx, idx_to_user, idx_to_item, R = get_mappings_and_matrix(dataset_key, interactions)
 
     # Product lookup for display
-    product_lookup = build_product_lookup(raw_df)
+    product_lookup = build_product_lookup(dataset_key, raw_df)
+
+    # Selectbox options: sort unique IDs once per dataset, not on every rerun
+    @st.cache_data
+    def get_sorted_users(key, _interactions):
+        return sorted(_interactions["user_id"].unique().tolist())
+
+    @st.cache_data
+    def get_sorted_products(key, _interactions):
+        return sorted(_interactions["product_id"].unique().tolist())
+
+    all_users = get_sorted_users(dataset_key, interactions)
+    all_products = get_sorted_products(dataset_key, interactions)
 
     # Safe SVD components (avoid ValueError)
     n_users, n_items = R.shape
@@ -168,10 +212,10 @@ try:
         st.write("Shows the most popular products based on weighted rating scores.")
 
         @st.cache_data
-        def get_popularity_table(_interactions, min_reviews, n):
+        def get_popularity_table(key, _interactions, min_reviews, n):
             return get_popular_products(_interactions, min_reviews, n)
 
-        popular_df = get_popularity_table(interactions, min_popularity_reviews, top_n)
+        popular_df = get_popularity_table(dataset_key, interactions, min_popularity_reviews, top_n)
 
         if not popular_df.empty:
             # Add product name/brand columns
@@ -193,28 +237,42 @@ try:
         st.header("Item-KNN Collaborative Filtering")
         st.write("Recommends products similar to items the user has liked.")
 
-        all_users = sorted(interactions["user_id"].unique())
         selected_user = st.selectbox("Select a user", options=all_users, key="knn_user")
 
+        # Normalized item vectors are user-independent: compute once per dataset, keep by reference
+        @st.cache_resource
+        def get_item_vectors(key, _R):
+            return build_item_vectors(_R)
+
+        # user_id -> row positions in interactions, so a user's rows are a slice, not a full scan
+        @st.cache_resource
+        def get_user_row_index(key, _interactions):
+            return _interactions.groupby("user_id", observed=True).indices
+
         if st.button("Get Item-KNN Recommendations", key="knn_btn"):
+            user_rows = get_user_row_index(dataset_key, interactions).get(selected_user, [])
+            user_interactions = interactions.iloc[user_rows]
+
             with st.spinner("Computing item similarities..."):
+                item_vectors = get_item_vectors(dataset_key, R)
+
                 @st.cache_data
-                def get_knn_recs(user, _R, _item_to_idx, _idx_to_item, _interactions, threshold, n):
+                def get_knn_recs(key, user, threshold, n, _R, _item_vectors, _item_to_idx, _idx_to_item, _interactions):
                     return get_item_knn_recommendations(
-                        user, _R, _item_to_idx, _idx_to_item, _interactions, threshold, n
+                        user, _R, _item_vectors, _item_to_idx, _idx_to_item, _interactions, threshold, n
                     )
 
                 rec_ids = get_knn_recs(
-                    selected_user, R, item_to_idx, idx_to_item, interactions, like_threshold, top_n
+                    dataset_key, selected_user, like_threshold, top_n,
+                    R, item_vectors, item_to_idx, idx_to_item, user_interactions
                 )
 
             pretty_recommendations(rec_ids, product_lookup, title=f"Top {len(rec_ids)} Recommendations for {selected_user}")
 
             # Show liked items (by product name)
-            liked = interactions[
-                (interactions["user_id"] == selected_user) &
-                (interactions["rating"] >= like_threshold)
-            ]["product_id"].tolist()
+            liked = user_interactions.loc[
+                user_interactions["rating"] >= like_threshold, "product_id"
+            ].tolist()
 
             if liked:
                 with st.expander(f"📚 Items liked by {selected_user} (rating ≥ {like_threshold})"):
@@ -229,22 +287,29 @@ try:
         st.header("SVD Matrix Factorization")
         st.write("Uses matrix factorization to predict user preferences.")
 
-        all_users = sorted(interactions["user_id"].unique())
         selected_user_svd = st.selectbox("Select a user", options=all_users, key="svd_user")
 
         st.caption(f"Matrix size: {n_users} users × {n_items} products | Safe max components: {max_svd}")
         st.caption(f"Using SVD components = {svd_components_safe} (auto-clamped to avoid errors)")
 
+        # Factorization is user-independent: fit once per dataset and component count
+        @st.cache_resource
+        def get_svd_factors(key, _R, k):
+            return fit_svd(_R, k)
+
         if st.button("Get SVD Recommendations", key="svd_btn"):
             with st.spinner(f"Computing SVD with {svd_components_safe} components..."):
+                svd_factors = get_svd_factors(dataset_key, R, svd_components_safe)
+
                 @st.cache_data
-                def get_svd_recs(user, _R, _user_to_idx, _idx_to_item, _interactions, components, n):
+                def get_svd_recs(key, user, components, n, _R, _svd_factors, _user_to_idx, _idx_to_item):
                     return get_svd_recommendations(
-                        user, _R, _user_to_idx, _idx_to_item, _interactions, components, n
+                        user, _R, _svd_factors, _user_to_idx, _idx_to_item, n
                     )
 
                 rec_ids = get_svd_recs(
-                    selected_user_svd, R, user_to_idx, idx_to_item, interactions, svd_components_safe, top_n
+                    dataset_key, selected_user_svd, svd_components_safe, top_n,
+                    R, svd_factors, user_to_idx, idx_to_item
                 )
 
             pretty_recommendations(rec_ids, product_lookup, title=f"Top {len(rec_ids)} Recommendations for {selected_user_svd}")
@@ -256,20 +321,26 @@ try:
         st.header("Content-Based Filtering")
         st.write("Finds similar products based on review text using TF-IDF.")
 
-        all_products = sorted(interactions["product_id"].unique())
         selected_product = st.selectbox("Select a product", options=all_products, key="content_product")
 
         # show selected product name
         meta = product_lookup.get(selected_product, {})
         st.info(f"Selected: {meta.get('name','(name not available)')}  —  {selected_product}")
 
+        # TF-IDF index is product-independent: fit once per dataset, keep by reference
+        @st.cache_resource
+        def get_content_index(key, _raw_df):
+            return build_content_index(_raw_df)
+
         if st.button("Get Similar Products", key="content_btn"):
             with st.spinner("Computing content similarities..."):
+                content_index = get_content_index(dataset_key, raw_df)
+
                 @st.cache_data
-                def get_content_recs(product, _raw_df, n):
-                    return get_content_based_recommendations(product, _raw_df, n)
+                def get_content_recs(key, product, n, _content_index):
+                    return get_content_based_recommendations(product, _content_index, n)
 
-                rec_ids = get_content_recs(selected_product, raw_df, top_n)
+                rec_ids = get_content_recs(dataset_key, selected_product, top_n, content_index)
 
             pretty_recommendations(rec_ids, product_lookup, title=f"Top {len(rec_ids)} Similar Products")
 
@@ -1,13 +1,21 @@
+import numpy as np
 import pandas as pd
 import streamlit as st
 
 def load_and_preprocess_data(file_path, min_user_reviews=3, min_product_reviews=3):
     
     required_cols = ['reviews.username', 'asins', 'reviews.rating']
+    optional_cols = ['reviews.text', 'reviews.title', 'name', 'brand']
+    needed_cols = set(required_cols + optional_cols)
+    
+    # Only parse the columns we use (the raw export also has URLs, images, dates, ...).
+    # reviews.rating is left to inference so malformed values are coerced below
+    # instead of failing the whole read.
+    string_cols = {col: 'string' for col in needed_cols if col != 'reviews.rating'}
     
     # Read CSV
     try:
-        df = pd.read_csv(file_path, low_memory=False)
+        df = pd.read_csv(file_path, usecols=lambda col: col in needed_cols, dtype=string_cols)
     except Exception as e:
         raise ValueError(f"Error reading CSV file: {str(e)}")
     
@@ -20,7 +28,7 @@ def load_and_preprocess_data(file_path, min_user_reviews=3, min_product_reviews=
     df = df.dropna(subset=required_cols)
     
     # Convert rating to numeric
-    df['reviews.rating'] = pd.to_numeric(df['reviews.rating'], errors='coerce')
+    df['reviews.rating'] = pd.to_numeric(df['reviews.rating'], errors='coerce').astype('float32')
     df = df.dropna(subset=['reviews.rating'])
     
     # Filter valid ratings (1-5)
@@ -29,18 +37,12 @@ def load_and_preprocess_data(file_path, min_user_reviews=3, min_product_reviews=
     # Create user_id from reviews.username (trimmed)
     df['user_id'] = df['reviews.username'].astype(str).str.strip()
     
-    # Create product_id from first ASIN in asins column
-    def extract_first_asin(asins_str):
-        """Extract first ASIN from comma-separated string"""
-        if pd.isna(asins_str):
-            return None
-        asins_str = str(asins_str).strip()
-        if ',' in asins_str:
-            return asins_str.split(',')[0].strip()
-        return asins_str
-    
-    df['product_id'] = df['asins'].apply(extract_first_asin)
+    # Create product_id from first ASIN in asins column (comma-separated)
+    df['product_id'] = (
+        df['asins'].astype('string').str.split(',', n=1).str[0].str.strip()
+    )
     df = df.dropna(subset=['product_id'])
+    df = df[df['product_id'] != '']
     
     # Fill missing text fields with empty strings
     if 'reviews.text' in df.columns:
@@ -59,31 +61,46 @@ def load_and_preprocess_data(file_path, min_user_reviews=3, min_product_reviews=
     if 'reviews.text' in df.columns:
         duplicate_cols.append('reviews.text')
     
-    df = df.drop_duplicates(subset=duplicate_cols, keep='first')
+    # Hash each row's key columns to one uint64 and dedupe on that, rather than
+    # comparing (often long) review text tuples
+    row_hashes = pd.util.hash_pandas_object(df[duplicate_cols], index=False)
+    df = df[~row_hashes.duplicated(keep='first').to_numpy()]
     
     # Filter sparse users and products
     initial_rows = len(df)
     
-    # Iterative filtering to handle cascading effects
-    prev_rows = 0
+    # Iterative filtering to handle cascading effects.
+    # Work on integer codes + a boolean row mask; the dataframe is sliced once at the end.
+    user_codes = pd.factorize(df['user_id'])[0]
+    product_codes = pd.factorize(df['product_id'])[0]
+    n_user_codes = user_codes.max() + 1 if len(df) else 0
+    n_product_codes = product_codes.max() + 1 if len(df) else 0
+    keep = np.ones(len(df), dtype=bool)
+    
+    prev_rows = -1
     iterations = 0
     max_iterations = 10
     
-    while prev_rows != len(df) and iterations < max_iterations:
-        prev_rows = len(df)
+    while prev_rows != keep.sum() and iterations < max_iterations:
+        prev_rows = keep.sum()
         
         # Count reviews per user
-        user_counts = df['user_id'].value_counts()
-        valid_users = user_counts[user_counts >= min_user_reviews].index
-        df = df[df['user_id'].isin(valid_users)]
+        user_counts = np.bincount(user_codes[keep], minlength=n_user_codes)
+        keep &= user_counts[user_codes] >= min_user_reviews
         
         # Count reviews per product
-        product_counts = df['product_id'].value_counts()
-        valid_products = product_counts[product_counts >= min_product_reviews].index
-        df = df[df['product_id'].isin(valid_products)]
+        product_counts = np.bincount(product_codes[keep], minlength=n_product_codes)
+        keep &= product_counts[product_codes] >= min_product_reviews
         
         iterations += 1
     
+    df = df[keep].copy()
+    
+    # Categorical IDs make the downstream groupbys and equality filters work on
+    # integer codes. Built after filtering, so every category is observed.
+    df['user_id'] = df['user_id'].astype('category')
+    df['product_id'] = df['product_id'].astype('category')
+    
     # Create interactions dataframe
     interactions = df[['user_id', 'product_id', 'reviews.rating']].copy()
     interactions.columns = ['user_id', 'product_id', 'rating']
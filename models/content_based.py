@@ -1,38 +1,61 @@
-from sklearn.feature_extraction.text import TfidfVectorizer
-from sklearn.metrics.pairwise import cosine_similarity
+from sklearn.feature_extraction.text import HashingVectorizer, TfidfTransformer
+import numpy as np
 import pandas as pd
+from utils.helpers import top_n_indices
 
-def get_content_based_recommendations(product_id, raw_df, top_n=10, max_features=5000):
+try:
+    from sparse_dot_topn import sp_matmul_topn
+except ImportError:  # optional: fall back to a plain sparse dot + argpartition
+    sp_matmul_topn = None
+
+def build_content_index(raw_df, max_features=5000, min_df=2, max_df=0.8):
     """
-    Recommend similar products using TF-IDF on review text.
+    Build the TF-IDF index used for content-based recommendations.
     
     Algorithm:
     1. Aggregate all review text per product (title + text)
-    2. Vectorize product documents using TF-IDF
-    3. Compute cosine similarity between product vectors
-    4. For the selected product, return top N most similar products
+    2. Count terms with HashingVectorizer (no vocabulary dict to build)
+    3. Prune hashed terms by document frequency and keep the max_features
+       most frequent, as TfidfVectorizer would
+    4. Apply TF-IDF weighting (rows are L2-normalized)
     
     Parameters:
     -----------
-    product_id : str
-        Product identifier
     raw_df : pd.DataFrame
         Full preprocessed dataframe with reviews.title and reviews.text
-    top_n : int
-        Number of similar products to return
     max_features : int
         Maximum number of TF-IDF features
+    min_df : int
+        Minimum number of product documents a term must appear in
+    max_df : float
+        Maximum fraction of product documents a term may appear in
     
     Returns:
     --------
-    list
-        List of similar product_ids (excluding the input product)
+    tuple or None
+        (tfidf_matrix, tfidf_matrix_t, product_id_to_row, row_to_product_id),
+        or None if there is not enough text to build an index.
+        tfidf_matrix_t is the transposed matrix in CSR form, only built
+        when sparse_dot_topn is installed
     """
-    # Aggregate text per product
-    product_text = raw_df.groupby('product_id').agg({
-        'reviews.title': lambda x: ' '.join(x.fillna('')),
-        'reviews.text': lambda x: ' '.join(x.fillna(''))
-    }).reset_index()
+    if raw_df.empty:
+        return None
+    
+    # Aggregate text per product: stable-sort rows by product code and join each
+    # contiguous run, instead of a Python lambda per groupby group
+    codes, product_ids = pd.factorize(raw_df['product_id'], sort=True)
+    order = np.argsort(codes, kind='stable')
+    bounds = np.flatnonzero(np.diff(codes[order])) + 1
+    
+    def join_per_product(col):
+        values = raw_df[col].fillna('').to_numpy(dtype=object)[order]
+        return [' '.join(chunk) for chunk in np.split(values, bounds)]
+    
+    product_text = pd.DataFrame({
+        'product_id': np.asarray(product_ids, dtype=object),
+        'reviews.title': join_per_product('reviews.title'),
+        'reviews.text': join_per_product('reviews.text')
+    })
     
     # Combine title and text
     product_text['content'] = (
@@ -42,43 +65,92 @@ def get_content_based_recommendations(product_id, raw_df, top_n=10, max_features
     # Remove empty content
     product_text = product_text[product_text['content'] != '']
     
-    if product_text.empty or product_id not in product_text['product_id'].values:
-        return []
+    if product_text.empty:
+        return None
     
-    # Create TF-IDF matrix
-    tfidf = TfidfVectorizer(
-        max_features=max_features,
+    # Raw term counts over a fixed hashed feature space
+    hasher = HashingVectorizer(
+        n_features=2 ** 20,
+        alternate_sign=False,
+        norm=None,
         stop_words='english',
-        min_df=2,
-        max_df=0.8,
         ngram_range=(1, 2)
     )
+    counts = hasher.transform(product_text['content']).tocsr()
     
-    try:
-        tfidf_matrix = tfidf.fit_transform(product_text['content'])
-    except ValueError:
+    # Document-frequency pruning, then keep the most frequent terms
+    doc_freq = np.bincount(counts.indices, minlength=counts.shape[1])
+    keep = np.flatnonzero((doc_freq >= min_df) & (doc_freq <= max_df * counts.shape[0]))
+    if keep.size == 0:
         # Not enough documents or features
+        return None
+    if keep.size > max_features:
+        term_freq = np.asarray(counts[:, keep].sum(axis=0)).ravel()
+        keep = np.sort(keep[top_n_indices(term_freq, max_features)])
+    counts = counts[:, keep]
+    
+    # Create TF-IDF matrix (rows L2-normalized, so dot product == cosine similarity)
+    tfidf_matrix = TfidfTransformer(norm='l2').fit_transform(counts).tocsr()
+    
+    # sp_matmul_topn wants the right-hand side in CSR; convert once here, not per query
+    tfidf_matrix_t = tfidf_matrix.T.tocsr() if sp_matmul_topn is not None else None
+    
+    row_to_product_id = product_text['product_id'].to_numpy()
+    product_id_to_row = {pid: row for row, pid in enumerate(row_to_product_id)}
+    
+    return tfidf_matrix, tfidf_matrix_t, product_id_to_row, row_to_product_id
+
+
+def get_content_based_recommendations(product_id, content_index, top_n=10):
+    """
+    Recommend similar products using a prebuilt TF-IDF index.
+    
+    Since TF-IDF rows are L2-normalized, cosine similarity against the
+    selected product is a single sparse dot product. With sparse_dot_topn
+    installed the product and top-N selection are fused, so no dense
+    similarity row is built. Only products with positive similarity are
+    returned.
+    
+    Parameters:
+    -----------
+    product_id : str
+        Product identifier
+    content_index : tuple or None
+        Output of build_content_index(raw_df)
+    top_n : int
+        Number of similar products to return
+    
+    Returns:
+    --------
+    list
+        List of similar product_ids (excluding the input product)
+    """
+    if content_index is None:
         return []
     
-    # Find index of the target product
-    product_indices = pd.Series(
-        product_text.index, 
-        index=product_text['product_id']
-    ).to_dict()
+    tfidf_matrix, tfidf_matrix_t, product_id_to_row, row_to_product_id = content_index
     
-    if product_id not in product_indices:
+    if product_id not in product_id_to_row:
         return []
     
-    idx = product_indices[product_id]
+    idx = product_id_to_row[product_id]
+    
+    if tfidf_matrix_t is not None:
+        # Fused sparse product + top-N; one extra slot since the product matches itself
+        top = sp_matmul_topn(tfidf_matrix[idx], tfidf_matrix_t, top_n=top_n + 1,
+                             threshold=0.0, sort=True)
+        similar_indices = top.indices[top.indices != idx][:top_n]
+        return row_to_product_id[similar_indices].tolist()
     
-    # Compute cosine similarity for this product against all others
-    product_vector = tfidf_matrix[idx]
-    similarities = cosine_similarity(product_vector, tfidf_matrix).flatten()
+    # Cosine similarity for this product against all others
+    similarities = (tfidf_matrix @ tfidf_matrix[idx].T).toarray().ravel()
+    similarities[similarities <= 0] = -np.inf
+    similarities[idx] = -np.inf
     
     # Get indices of most similar products (excluding itself)
-    similar_indices = similarities.argsort()[::-1][1:top_n+1]
+    similar_indices = top_n_indices(similarities, top_n)
     
     # Convert indices to product IDs
-    recommendations = product_text.iloc[similar_indices]['product_id'].tolist()
+    recommendations = row_to_product_id[similar_indices].tolist()
     
     return recommendations
\ No newline at end of file
@@ -1,52 +1,111 @@
+import threading
+
 import numpy as np
-from sklearn.metrics.pairwise import cosine_similarity
-from utils.helpers import most_popular_items
+from sklearn.preprocessing import normalize
+from utils.helpers import most_popular_items, top_n_indices
+
+try:
+    from numba import config as numba_config, njit, prange, threading_layer
+    # NOTE: process-wide numba setting, so it also applies to any other parallel
+    # numba code in this process. OpenMP is tried before TBB because some system
+    # TBB builds hang interpreter shutdown after use from a script thread.
+    # (numba's 'threadsafe' mode always tries TBB first, hence the explicit order;
+    # workqueue is rejected in csr_matvec instead.)
+    numba_config.THREADING_LAYER_PRIORITY = ['omp', 'tbb', 'workqueue']
+except ImportError:  # optional: fall back to scipy's sparse mat-vec
+    njit = None
+
+if njit is not None:
+    @njit(parallel=True, fastmath=True, nogil=True, cache=True)
+    def _csr_matvec_kernel(indptr, indices, data, x, out):
+        for i in prange(indptr.shape[0] - 1):
+            s = 0.0
+            for jj in range(indptr[i], indptr[i + 1]):
+                s += data[jj] * x[indices[jj]]
+            out[i] = s
+
+
+# None until the first call has loaded numba's threading layer
+_use_numba_kernel = None if njit is not None else False
+_numba_init_lock = threading.Lock()
+
+
+def _run_kernel(A, x):
+    out = np.empty(A.shape[0], dtype=np.float64)
+    _csr_matvec_kernel(A.indptr, A.indices, A.data, np.ascontiguousarray(x), out)
+    return out
 
-def get_item_knn_recommendations(user_id, R, item_to_idx, idx_to_item, interactions,
-                                like_threshold=4.0, top_n=10):
+
+def csr_matvec(A, x):
     """
-    Recommend items using item-item collaborative filtering with cosine similarity.
+    Compute A @ x for a CSR matrix A and a dense vector x, as a 1D float64 array.
+    With numba installed this runs a parallel kernel over the rows of A that
+    releases the GIL, so concurrent Streamlit sessions don't serialize on it.
     """
+    global _use_numba_kernel
 
-    # rating column compatibility
-    rating_col = "rating" if "rating" in interactions.columns else "reviews.rating"
+    if _use_numba_kernel is None:
+        with _numba_init_lock:
+            if _use_numba_kernel is None:
+                # The first call loads the threading layer; run it alone, then keep the
+                # kernel only if that layer is thread-safe. Concurrent calls under
+                # workqueue abort the whole process ("Concurrent access detected").
+                try:
+                    out = _run_kernel(A, x)
+                except ValueError:  # no threading layer could be loaded
+                    _use_numba_kernel = False
+                else:
+                    _use_numba_kernel = threading_layer() in ('omp', 'tbb')
+                    return out
 
-    user_ratings = interactions[interactions['user_id'] == user_id]
-
-    if user_ratings.empty:
-        return most_popular_items(R, idx_to_item, top_n)
+    if _use_numba_kernel:
+        return _run_kernel(A, x)
 
-    liked_items = user_ratings[user_ratings[rating_col] >= like_threshold]
+    return np.asarray(A @ x, dtype=np.float64).ravel()
 
-    if liked_items.empty:
-        return most_popular_items(R, idx_to_item, top_n)
 
-    liked_item_data = []
-    for _, row in liked_items.iterrows():
-        pid = row["product_id"]
-        if pid in item_to_idx:
-            liked_item_data.append((item_to_idx[pid], float(row[rating_col])))
+def build_item_vectors(R):
+    """
+    L2-normalize item rating vectors once (items x users, CSR), so cosine
+    similarity is a plain dot product: sim(a, b) = N[a] . N[b].
+    User-independent, so it can be computed once per dataset and reused.
+    """
+    return normalize(R.T.tocsr(), norm='l2', axis=1)
 
-    if not liked_item_data:
-        return most_popular_items(R, idx_to_item, top_n)
 
-    # item-item similarity (compute once)
-    item_similarity = cosine_similarity(R.T, dense_output=False)
+def get_item_knn_recommendations(user_id, R, item_vectors, item_to_idx, idx_to_item,
+                                interactions, like_threshold=4.0, top_n=10):
+    """
+    Recommend items using item-item collaborative filtering with cosine similarity.
+    `item_vectors` is the normalized item matrix from build_item_vectors(R).
+    """
 
-    candidate_scores = {}
+    # rating column compatibility
+    rating_col = "rating" if "rating" in interactions.columns else "reviews.rating"
 
-    for candidate_idx in range(R.shape[1]):
-        score = 0.0
-        for liked_idx, user_rating in liked_item_data:
-            sim_val = item_similarity[candidate_idx, liked_idx]
-            sim_val = float(sim_val) if np.isscalar(sim_val) else float(sim_val.toarray()[0][0])
-            score += sim_val * float(user_rating)
-        candidate_scores[candidate_idx] = score
+    user_ratings = interactions[interactions['user_id'] == user_id]
 
-    rated_items = set(
-        item_to_idx[pid] for pid in user_ratings["product_id"] if pid in item_to_idx
+    # Column arrays for the user's rows; item index -1 marks products not in R
+    pids = user_ratings["product_id"].to_numpy()
+    ratings = user_ratings[rating_col].to_numpy(dtype=np.float32)
+    item_locs = np.fromiter(
+        (item_to_idx.get(pid, -1) for pid in pids), dtype=np.int64, count=len(pids)
     )
-    candidate_scores = {i: s for i, s in candidate_scores.items() if i not in rated_items}
+    known = item_locs >= 0
+    liked = known & (ratings >= like_threshold)
+
+    if not liked.any():
+        return most_popular_items(R, idx_to_item, top_n)
+
+    # score(c) = sum over liked l of cos(c, l) * rating(l) = N[c] . (N[liked].T @ ratings).
+    # Two sparse mat-vecs; the n_items x n_items similarity matrix is never built.
+    liked_idx = item_locs[liked]
+    liked_ratings = ratings[liked]
+    user_profile = item_vectors[liked_idx].T @ liked_ratings
+    scores = csr_matvec(item_vectors, user_profile)
+
+    # Remove already-rated items
+    scores[item_locs[known]] = -np.inf
 
-    sorted_candidates = sorted(candidate_scores.items(), key=lambda x: x[1], reverse=True)[:top_n]
-    return [idx_to_item[i] for i, _ in sorted_candidates]
+    top_indices = top_n_indices(scores, top_n)
+    return [idx_to_item[i] for i in top_indices]
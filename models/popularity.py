@@ -1,11 +1,13 @@
+import numpy as np
 import pandas as pd
+from utils.helpers import top_n_indices
 
 def get_popular_products(interactions, min_reviews=5, top_n=10):
     rating_col = "rating" if "rating" in interactions.columns else "reviews.rating"
 
     C = interactions[rating_col].mean()
 
-    product_stats = interactions.groupby("product_id").agg(
+    product_stats = interactions.groupby("product_id", observed=True).agg(
         mean_rating=(rating_col, "mean"),
         rating_count=(rating_col, "count")
     ).reset_index()
@@ -14,14 +16,16 @@ def get_popular_products(interactions, min_reviews=5, top_n=10):
     if product_stats.empty:
         return pd.DataFrame()
 
+    # Weighted score on raw arrays: w * mean + (1 - w) * C, with w = n / (n + m)
     m = min_reviews
-    product_stats["weighted_score"] = (
-        (product_stats["rating_count"] / (product_stats["rating_count"] + m)) * product_stats["mean_rating"] +
-        (m / (product_stats["rating_count"] + m)) * C
-    )
+    n = product_stats["rating_count"].to_numpy(dtype=np.float64)
+    mu = product_stats["mean_rating"].to_numpy(dtype=np.float64)
+    w = n / (n + m)
+    weighted = w * mu + (1.0 - w) * C
 
-    top_products = product_stats.nlargest(top_n, "weighted_score")
-    top_products["mean_rating"] = top_products["mean_rating"].round(2)
-    top_products["weighted_score"] = top_products["weighted_score"].round(3)
+    top_indices = top_n_indices(weighted, top_n)
+    top_products = product_stats.iloc[top_indices].copy()
+    top_products["mean_rating"] = mu[top_indices].round(2)
+    top_products["weighted_score"] = weighted[top_indices].round(3)
 
     return top_products[["product_id", "mean_rating", "rating_count", "weighted_score"]]
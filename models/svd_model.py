@@ -1,20 +1,17 @@
 from sklearn.decomposition import TruncatedSVD
+from scipy.sparse.linalg import ArpackError, ArpackNoConvergence, svds
 import numpy as np
-from utils.helpers import most_popular_items
+from utils.helpers import most_popular_items, top_n_indices
 
-def get_svd_recommendations(user_id, R, user_to_idx, idx_to_item, interactions,
-                            n_components=20, top_n=10, random_state=42, item_to_idx=None):
+def fit_svd(R, n_components=20, random_state=42):
     """
-    Recommend items using SVD matrix factorization.
-    (Minimal fix: safe n_components + optional item_to_idx to remove already-rated items)
+    Factorize the user-item matrix with a truncated SVD.
+    User-independent, so it can be fitted once per dataset and reused.
+    Very sparse matrices (< 1% filled) use the Lanczos solver in
+    scipy.sparse.linalg.svds; denser ones use sklearn's randomized
+    TruncatedSVD (also the fallback if svds fails to converge).
+    Returns (user_factors, item_factors), or None if R is too small.
     """
-
-    # Check if user exists
-    if user_id not in user_to_idx:
-        return most_popular_items(R, idx_to_item, top_n)
-
-    user_idx = user_to_idx[user_id]
-
     n_users, n_items = R.shape
 
     # IMPORTANT: TruncatedSVD requires n_components < n_items
@@ -22,34 +19,48 @@ def get_svd_recommendations(user_id, R, user_to_idx, idx_to_item, interactions,
     n_components = int(min(n_components, max_components))
 
     if n_components < 1:
-        return most_popular_items(R, idx_to_item, top_n)
+        return None
+
+    density = R.nnz / float(n_users * n_items)
+    if density < 0.01 and n_components < min(n_users, n_items):
+        try:
+            U, s, Vt = svds(R.astype(np.float32, copy=False), k=n_components, which='LM',
+                            random_state=random_state)
+        except (ArpackError, ArpackNoConvergence):
+            pass  # fall back to TruncatedSVD below
+        else:
+            # svds returns singular values in ascending order
+            order = np.argsort(s)[::-1]
+            user_factors = U[:, order] * s[order]
+            item_factors = Vt[order]
+            return user_factors, item_factors
 
     svd = TruncatedSVD(n_components=n_components, random_state=random_state)
     user_factors = svd.fit_transform(R)
     item_factors = svd.components_
+    return user_factors, item_factors
+
+
+def get_svd_recommendations(user_id, R, svd_factors, user_to_idx, idx_to_item, top_n=10):
+    """
+    Recommend items using SVD matrix factorization.
+    `svd_factors` is the precomputed (user_factors, item_factors) from fit_svd(R).
+    """
+
+    # Check if user exists
+    if user_id not in user_to_idx or svd_factors is None:
+        return most_popular_items(R, idx_to_item, top_n)
+
+    user_idx = user_to_idx[user_id]
+    user_factors, item_factors = svd_factors
 
     user_vector = user_factors[user_idx]
     predicted_scores = np.dot(user_vector, item_factors)
 
-    # Remove already-rated items (works even if item_to_idx not passed)
-    predicted_scores = predicted_scores.copy()
-
-    if item_to_idx is not None:
-        user_ratings = interactions[interactions['user_id'] == user_id]
-        rated_items = set(
-            item_to_idx[pid]
-            for pid in user_ratings['product_id']
-            if pid in item_to_idx
-        )
-        for item_idx in rated_items:
-            predicted_scores[item_idx] = -np.inf
-    else:
-        # fallback: use the matrix row to mask seen items
-        seen = set(R[user_idx].nonzero()[1])
-        for item_idx in seen:
-            predicted_scores[item_idx] = -np.inf
-
-    top_indices = np.argsort(predicted_scores)[::-1][:top_n]
-    top_indices = [i for i in top_indices if predicted_scores[i] > -np.inf]
+    # Remove already-rated items: the user's stored columns in the CSR row
+    seen = R.indices[R.indptr[user_idx]:R.indptr[user_idx + 1]]
+    predicted_scores[seen] = -np.inf
+
+    top_indices = top_n_indices(predicted_scores, top_n)
 
     return [idx_to_item[i] for i in top_indices]
@@ -1,3 +1,4 @@
+import numpy as np
 import pandas as pd
 from scipy.sparse import csr_matrix
 
@@ -21,18 +22,30 @@ def build_id_mappings(interactions):
     idx_to_item : dict
         Mapping from matrix column index to product_id
     """
-    unique_users = sorted(interactions['user_id'].unique())
-    unique_items = sorted(interactions['product_id'].unique())
+    # Sorted uniques via pandas' hash-based factorize (no per-row Python work)
+    unique_users = pd.factorize(interactions['user_id'], sort=True)[1].tolist()
+    unique_items = pd.factorize(interactions['product_id'], sort=True)[1].tolist()
     
-    user_to_idx = {user: idx for idx, user in enumerate(unique_users)}
-    item_to_idx = {item: idx for idx, item in enumerate(unique_items)}
+    user_to_idx = dict(zip(unique_users, range(len(unique_users))))
+    item_to_idx = dict(zip(unique_items, range(len(unique_items))))
     
-    idx_to_user = {idx: user for user, idx in user_to_idx.items()}
-    idx_to_item = {idx: item for item, idx in item_to_idx.items()}
+    idx_to_user = dict(enumerate(unique_users))
+    idx_to_item = dict(enumerate(unique_items))
     
     return user_to_idx, item_to_idx, idx_to_user, idx_to_item
 
 
+def _lookup_indices(ids, id_to_idx):
+    """Vectorized equivalent of ids.map(id_to_idx) for an ID -> index dict."""
+    positions = pd.Index(list(id_to_idx.keys())).get_indexer(ids)
+    # get_indexer marks unknown IDs with -1, which would silently index the last entry
+    missing = positions < 0
+    if missing.any():
+        unknown = pd.unique(np.asarray(ids, dtype=object)[missing])
+        raise ValueError(f"IDs missing from mapping: {list(unknown[:5])}")
+    return np.fromiter(id_to_idx.values(), dtype=np.int64, count=len(id_to_idx))[positions]
+
+
 def build_user_item_matrix(interactions, user_to_idx, item_to_idx):
     """
     Build a sparse user-item rating matrix.
@@ -49,12 +62,13 @@ def build_user_item_matrix(interactions, user_to_idx, item_to_idx):
     Returns:
     --------
     R : scipy.sparse.csr_matrix
-        Sparse user-item rating matrix of shape (n_users, n_items)
+        Sparse float32 user-item rating matrix of shape (n_users, n_items)
     """
-    # Map IDs to indices
-    row_indices = interactions['user_id'].map(user_to_idx).values
-    col_indices = interactions['product_id'].map(item_to_idx).values
-    ratings = interactions['rating'].values
+    # Map IDs to indices with a vectorized hash lookup instead of a per-row dict.get
+    row_indices = _lookup_indices(interactions['user_id'], user_to_idx)
+    col_indices = _lookup_indices(interactions['product_id'], item_to_idx)
+    # Ratings are 1-5, float32 is plenty and halves the bytes moved by every SpMV
+    ratings = interactions['rating'].to_numpy(dtype=np.float32)
     
     # Create sparse matrix
     n_users = len(user_to_idx)
@@ -68,6 +82,39 @@ def build_user_item_matrix(interactions, user_to_idx, item_to_idx):
     return R
 
 
+def top_n_indices(scores, top_n=10):
+    """
+    Get the indices of the highest scores, best first.
+    
+    Uses np.partition (O(n)) to find the top_n-th score and only sorts the
+    selected entries, instead of argsorting the whole array. Ties are broken
+    by lower index first, matching Series.nlargest(keep='first'). Entries set
+    to -np.inf are treated as masked and never returned.
+    
+    Parameters:
+    -----------
+    scores : np.ndarray
+        1D array of scores
+    top_n : int
+        Number of indices to return
+    
+    Returns:
+    --------
+    np.ndarray
+        Up to top_n indices sorted by descending score
+    """
+    top_n = min(top_n, int(np.isfinite(scores).sum()))
+    if top_n <= 0:
+        return np.array([], dtype=np.intp)
+    
+    kth_score = -np.partition(-scores, top_n - 1)[top_n - 1]
+    above = np.flatnonzero(scores > kth_score)
+    # Fill the remaining slots with the lowest-index entries tied at the cutoff
+    ties = np.flatnonzero(scores == kth_score)[:top_n - len(above)]
+    top_indices = np.concatenate([above, ties])
+    return top_indices[np.argsort(-scores[top_indices], kind='stable')]
+
+
 def most_popular_items(R, idx_to_item, top_n=10):
     """
     Get the most popular items based on rating counts.
@@ -86,11 +133,11 @@ def most_popular_items(R, idx_to_item, top_n=10):
     list
         List of product_ids sorted by popularity
     """
-    # Count non-zero ratings per item
-    item_counts = (R > 0).sum(axis=0).A1  # Convert to 1D array
+    # Count stored ratings per item: one pass over the CSR column indices
+    item_counts = np.bincount(R.indices, minlength=R.shape[1])
     
     # Get top N item indices
-    top_indices = item_counts.argsort()[::-1][:top_n]
+    top_indices = top_n_indices(item_counts, top_n)
     
     # Convert indices to product IDs
     popular_items = [idx_to_item[idx] for idx in top_indices]